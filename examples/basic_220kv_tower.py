@@ -7,17 +7,22 @@
 
 import sys
 import os
+import io
+import math
 import numpy as np
 from pathlib import Path
 
-# 添加父目录到路径以导入求解器
-sys.path.append(str(Path(__file__).parent.parent))
+try:
+    import numba
+except ImportError:
+    numba = None  # 未安装numba时使用NumPy实现
 
 try:
     from tower_em_solver import solve_tower_electric_field
+    from tower_em_utils.npz_reader import load_npz_arrays, load_npz_metadata
 except ImportError as e:
     print(f"错误：无法导入求解器模块: {e}")
-    print("请确保已安装Firedrake并激活虚拟环境")
+    print("请确保已安装Firedrake并激活虚拟环境，并在仓库根目录执行 pip install -e .")
     sys.exit(1)
 
 def main():
@@ -47,9 +52,12 @@ def main():
             print("\n✅ 仿真成功完成！")
             
             # 分析结果
-            result_files = list(Path(output_dir).glob("basic_220kv_example_*.npz"))
+            # 单次scandir遍历目录，按名称过滤后max中每个条目最多stat一次
+            with os.scandir(output_dir) as entries:
+                result_files = [e for e in entries
+                                if e.name.startswith("basic_220kv_example_") and e.name.endswith(".npz")]
             if result_files:
-                latest_result = max(result_files, key=os.path.getctime)
+                latest_result = Path(max(result_files, key=lambda e: e.stat().st_ctime).path)
                 print(f"📊 结果文件: {latest_result}")
                 
                 # 加载和分析数据
@@ -69,15 +77,62 @@ def main():
     
     return True
 
+# 电场强度数量级分布的统计范围 [1e-10, 1e12)
+EXP_MIN, EXP_MAX = -10, 12
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _emag_stats_kernel(E, exp_min, n_bins, n_chunks):
+        """单次遍历E_mag，返回 (最小值, 最大值, 总和, 数量级计数)"""
+        chunk = (E.size + n_chunks - 1) // n_chunks
+        # 每个线程写各自的局部结果，最后再合并，避免并行写冲突
+        mins = np.full(n_chunks, E[0])
+        maxs = np.full(n_chunks, E[0])
+        sums = np.zeros(n_chunks)
+        counts = np.zeros((n_chunks, n_bins), np.int64)
+        for c in numba.prange(n_chunks):
+            for i in range(c * chunk, min((c + 1) * chunk, E.size)):
+                v = E[i]
+                if v < mins[c]:
+                    mins[c] = v
+                if v > maxs[c]:
+                    maxs[c] = v
+                sums[c] += v
+                if v > 0:
+                    k = int(math.floor(math.log10(v))) - exp_min
+                    if 0 <= k < n_bins:
+                        counts[c, k] += 1
+        return mins.min(), maxs.max(), sums.sum(), counts.sum(axis=0)
+
+def emag_stats(E_mag):
+    """计算电场强度的最小值、最大值、平均值和各数量级的点数"""
+    
+    n_bins = EXP_MAX - EXP_MIN
+    if numba is not None:
+        mn, mx, total, counts = _emag_stats_kernel(np.asarray(E_mag), EXP_MIN, n_bins,
+                                                 numba.get_num_threads())
+        return mn, mx, total / E_mag.size, counts
+    
+    # 只做一次log10，无需先按 E_mag > 0 筛选拷贝；非正值截断到1e-300，落在统计范围之外
+    log_e = np.log10(np.clip(E_mag, 1e-300, None))
+    exps = np.floor(log_e).astype(np.int32) - EXP_MIN
+    counts = np.bincount(exps[(exps >= 0) & (exps < n_bins)], minlength=n_bins)
+    return E_mag.min(), E_mag.max(), E_mag.mean(), counts
+
 def analyze_results(npz_file):
     """分析仿真结果"""
     
-    print(f"\n📈 分析结果文件: {npz_file}")
-    print("-" * 40)
+    # 报告先写入缓冲区，最后一次性输出
+    buf = io.StringIO()
+    
+    print(f"\n📈 分析结果文件: {npz_file}", file=buf)
+    print("-" * 40, file=buf)
     
     try:
-        # 加载数据
-        data = np.load(npz_file, allow_pickle=True)
+        # 加载数据 - 未压缩的数组以内存映射方式读取，只读入归约时访问的页面
+        # 注意：求解器应使用 np.savez (不压缩) 写结果；需要节省磁盘时交给文件系统
+        # 透明压缩 (如btrfs/zfs的zstd)，比zlib解压快得多且不妨碍内存映射
+        data = load_npz_arrays(npz_file, ['coordinates', 'E_mag', 'phi_real', 'phi_imag'])
         
         # 基本统计
         coordinates = data['coordinates']
@@ -85,45 +140,51 @@ def analyze_results(npz_file):
         phi_real = data['phi_real']
         phi_imag = data['phi_imag']
         
-        print(f"📍 数据点数量: {len(coordinates):,}")
-        print(f"📏 空间范围:")
-        print(f"   X: [{coordinates[:, 0].min():.1f}, {coordinates[:, 0].max():.1f}] m")
-        print(f"   Y: [{coordinates[:, 1].min():.1f}, {coordinates[:, 1].max():.1f}] m") 
-        print(f"   Z: [{coordinates[:, 2].min():.1f}, {coordinates[:, 2].max():.1f}] m")
+        # 按列一次归约出三个坐标轴的范围，避免对跨步切片 coordinates[:, k] 逐个遍历
+        coord_min = coordinates.min(axis=0)
+        coord_max = coordinates.max(axis=0)
+        
+        print(f"📍 数据点数量: {len(coordinates):,}", file=buf)
+        print(f"📏 空间范围:", file=buf)
+        print(f"   X: [{coord_min[0]:.1f}, {coord_max[0]:.1f}] m", file=buf)
+        print(f"   Y: [{coord_min[1]:.1f}, {coord_max[1]:.1f}] m", file=buf)
+        print(f"   Z: [{coord_min[2]:.1f}, {coord_max[2]:.1f}] m", file=buf)
+        
+        # 最小/最大/平均值与数量级分布共用一次遍历，中位数单独基于partition计算
+        E_min, E_max, E_mean, counts = emag_stats(E_mag)
         
-        print(f"\n⚡ 电场强度统计:")
-        print(f"   最小值: {E_mag.min():.2e} V/m")
-        print(f"   最大值: {E_mag.max():.2e} V/m")
-        print(f"   平均值: {E_mag.mean():.2e} V/m")
-        print(f"   中位数: {np.median(E_mag):.2e} V/m")
+        print(f"\n⚡ 电场强度统计:", file=buf)
+        print(f"   最小值: {E_min:.2e} V/m", file=buf)
+        print(f"   最大值: {E_max:.2e} V/m", file=buf)
+        print(f"   平均值: {E_mean:.2e} V/m", file=buf)
+        print(f"   中位数: {np.median(E_mag):.2e} V/m", file=buf)
         
-        print(f"\n🔌 电位统计:")
-        print(f"   实部范围: [{phi_real.min():.2e}, {phi_real.max():.2e}] V")
-        print(f"   虚部范围: [{phi_imag.min():.2e}, {phi_imag.max():.2e}] V")
+        print(f"\n🔌 电位统计:", file=buf)
+        print(f"   实部范围: [{phi_real.min():.2e}, {phi_real.max():.2e}] V", file=buf)
+        print(f"   虚部范围: [{phi_imag.min():.2e}, {phi_imag.max():.2e}] V", file=buf)
         
         # 数量级分布分析
-        print(f"\n📊 电场强度数量级分布:")
-        for exp in range(-10, 12):
-            lower = 10**exp
-            upper = 10**(exp+1)
-            count = np.sum((E_mag >= lower) & (E_mag < upper))
+        print(f"\n📊 电场强度数量级分布:", file=buf)
+        for exp, count in zip(range(EXP_MIN, EXP_MAX), counts):
             if count > 0:
                 percentage = count / len(E_mag) * 100
-                print(f"   1e{exp:2d} - 1e{exp+1:2d}: {count:8d} 点 ({percentage:5.2f}%)")
+                print(f"   1e{exp:2d} - 1e{exp+1:2d}: {count:8d} 点 ({percentage:5.2f}%)", file=buf)
         
         # 检查元数据
-        if 'metadata' in data:
-            metadata = data['metadata'].item()
+        metadata = load_npz_metadata(npz_file)
+        if metadata is not None:
             if 'computation_time' in metadata:
-                print(f"\n⏱️  计算时间: {metadata['computation_time']:.2f} 秒")
+                print(f"\n⏱️  计算时间: {metadata['computation_time']:.2f} 秒", file=buf)
             if 'box_filter_info' in metadata:
                 box_info = metadata['box_filter_info']
-                print(f"📦 数据过滤: {box_info['box_air_points']}/{box_info['total_points']} ({box_info['percentage']:.1f}%)")
+                print(f"📦 数据过滤: {box_info['box_air_points']}/{box_info['total_points']} ({box_info['percentage']:.1f}%)", file=buf)
         
-        print(f"\n✅ 数据分析完成")
+        print(f"\n✅ 数据分析完成", file=buf)
         
     except Exception as e:
-        print(f"❌ 分析失败: {e}")
+        print(f"❌ 分析失败: {e}", file=buf)
+    finally:
+        sys.stdout.write(buf.getvalue())
 
 if __name__ == "__main__":
     success = main()
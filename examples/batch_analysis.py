@@ -7,21 +7,49 @@
 
 import sys
 import os
+import io
+import argparse
 import numpy as np
 from pathlib import Path
 import time
-from concurrent.futures import ProcessPoolExecutor
+import math
+import queue
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import multiprocessing
 
-# 添加父目录到路径
-sys.path.append(str(Path(__file__).parent.parent))
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None  # 未安装threadpoolctl时只依赖继承的环境变量限制BLAS线程
 
 try:
-    from tower_em_solver import solve_tower_electric_field
+    from tower_em_utils.npz_reader import (load_npz_arrays, uncompressed_npz,
+                                  advise_sequential, drop_page_cache)
 except ImportError as e:
-    print(f"错误：无法导入求解器模块: {e}")
+    print(f"错误：无法导入工具模块: {e}")
+    print("请在仓库根目录执行 pip install -e . 安装求解器")
     sys.exit(1)
 
+# 并行模式下由 init_worker 设置的核心组队列，串行模式下为 None
+_core_queue = None
+
+# 等待空闲核心组的最长时间 (秒)，超时后不绑定核心直接运行
+CORE_WAIT_TIMEOUT = 60
+
+# 求解器在首次运行案例时才导入：导入Firedrake/PETSc需要数秒，
+# 主进程只负责调度和汇总，无需承担这部分开销
+_solver = None
+
+def get_solver():
+    """返回 solve_tower_electric_field，首次调用时导入"""
+    global _solver
+    if _solver is None:
+        from tower_em_solver import solve_tower_electric_field
+        _solver = solve_tower_electric_field
+    return _solver
+
 def run_single_case(case_params):
     """运行单个案例"""
     case_name, params = case_params
@@ -34,7 +62,7 @@ def run_single_case(case_params):
         os.makedirs(case_dir, exist_ok=True)
         
         # 运行仿真
-        success = solve_tower_electric_field(
+        success = get_solver()(
             output_dir=case_dir,
             npz_filename=f"case_{case_name}",
             **params
@@ -51,8 +79,115 @@ def run_single_case(case_params):
         print(f"❌ 案例 {case_name} 出错: {e}")
         return case_name, False, str(e)
 
-def main():
-    """批量分析主函数"""
+def group_cases(cases):
+    """按 max_conductivity 将案例分组
+
+    同组案例只是Robin边界系数不同，放在同一进程中依次运行，
+    可复用已导入的求解器和已编译的内核缓存。
+    """
+    groups = {}
+    for case_name, params in cases.items():
+        groups.setdefault(params["max_conductivity"], []).append((case_name, params))
+    return list(groups.values())
+
+def run_case_group(group):
+    """在同一进程中依次运行一组案例，整组共用一个核心组"""
+    cores = acquire_cores()
+    try:
+        return [run_single_case(case_params) for case_params in group]
+    finally:
+        release_cores(cores)
+
+def _cpu_package_id(cpu):
+    """读取CPU所在的物理插槽编号，读取失败时视为同一插槽"""
+    path = f"/sys/devices/system/cpu/cpu{cpu}/topology/physical_package_id"
+    try:
+        with open(path) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return 0
+
+def partition_cpus(n_groups):
+    """将当前可用CPU划分为 n_groups 个互不重叠的连续核心组
+
+    按物理插槽排序后再切分，使同一组内的核心尽量位于同一插槽，
+    避免工作进程跨NUMA节点迁移。不能整除时余下的核心分给前几组；
+    CPU数少于 n_groups 时只返回 len(cpus) 组，不分出空组。
+    不支持CPU亲和性的平台返回空组。
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return [[] for _ in range(n_groups)]
+    
+    cpus = sorted(os.sched_getaffinity(0), key=lambda c: (_cpu_package_id(c), c))
+    n_groups = min(n_groups, len(cpus))
+    return [[int(c) for c in group] for group in np.array_split(cpus, n_groups)]
+
+# 控制OpenMP/BLAS线程池大小的环境变量，各库只在加载时读取一次
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+@contextmanager
+def worker_thread_env(n_threads):
+    """在创建进程池期间设置线程数环境变量，结束后恢复
+    
+    spawn 出的工作进程在导入本模块(及NumPy)之前就继承了父进程的环境，
+    因此NumPy加载的OpenBLAS/MKL在加载时即受此限制；initializer 运行时
+    NumPy早已导入，在那里设置已经来不及。
+    """
+    saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    if n_threads:
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(n_threads)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def init_worker(core_queue):
+    """工作进程初始化：保存核心组队列并固定MKL/OpenMP的线程行为"""
+    global _core_queue
+    _core_queue = core_queue
+    
+    os.environ["MKL_DYNAMIC"] = "FALSE"
+    os.environ["KMP_AFFINITY"] = "granularity=fine,compact"
+
+def acquire_cores():
+    """从队列中取一个核心组，把当前进程绑定到该组并限制线程数"""
+    if _core_queue is None:
+        return None
+    
+    try:
+        cores = _core_queue.get(timeout=CORE_WAIT_TIMEOUT)
+    except queue.Empty:
+        # 核心组未归还 (例如持有它的进程异常退出)，不绑定核心以免无限等待
+        print(f"⚠️  {CORE_WAIT_TIMEOUT} 秒内没有空闲核心组，本组案例不绑定核心运行")
+        return None
+    if cores:
+        os.sched_setaffinity(0, cores)
+        # 每个进程的OpenMP/BLAS线程数不超过分配到的核心数，避免超额订阅。
+        # 已加载的线程池 (NumPy的BLAS) 只能通过threadpoolctl在运行时调整，
+        # 环境变量只对之后才加载的库 (PETSc等，见 get_solver) 生效
+        n_threads = len(cores)
+        if threadpool_limits is not None:
+            threadpool_limits(n_threads)
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(n_threads)
+    return cores
+
+def release_cores(cores):
+    """案例结束后把核心组放回队列，供下一个工作进程使用"""
+    if cores is not None:
+        _core_queue.put(cores)
+
+def main(selected_cases=None, max_workers=None):
+    """批量分析主函数
+
+    selected_cases 为要运行的案例名列表 (None 表示全部)，
+    max_workers 为并行进程数 (None 表示默认值)。
+    """
     
     print("🔋 电力塔电磁场批量分析")
     print("=" * 50)
@@ -90,6 +225,14 @@ def main():
         }
     }
     
+    if selected_cases:
+        unknown = [name for name in selected_cases if name not in cases]
+        if unknown:
+            print(f"❌ 未知案例: {', '.join(unknown)}")
+            print(f"   可选案例: {', '.join(cases)}")
+            return
+        cases = {name: cases[name] for name in selected_cases}
+    
     print(f"📋 计划运行 {len(cases)} 个案例:")
     for case_name, params in cases.items():
         print(f"   - {case_name}: {params}")
@@ -103,7 +246,7 @@ def main():
     if use_parallel:
         # 并行执行（如果系统支持）
         print(f"\n🚀 使用并行模式执行（{multiprocessing.cpu_count()} 核心）")
-        run_parallel(cases)
+        run_parallel(cases, max_workers)
     else:
         # 串行执行
         print(f"\n🔄 使用串行模式执行")
@@ -112,29 +255,77 @@ def main():
     # 分析批量结果
     analyze_batch_results()
 
-def run_parallel(cases):
+def run_parallel(cases, max_workers=None):
     """并行执行案例"""
     
-    # 限制并行进程数以避免内存问题
-    max_workers = min(multiprocessing.cpu_count(), 3)
-    
-    with ProcessPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有任务
-        future_to_case = {
-            executor.submit(run_single_case, (case_name, params)): case_name
-            for case_name, params in cases.items()
-        }
-        
-        # 收集结果
+    # 默认限制并行进程数以避免内存问题
+    if max_workers is None:
+        max_workers = min(multiprocessing.cpu_count(), 3)
+    
+    # spawn: 工作进程是全新的解释器，不会fork继承父进程中已被BLAS线程弄脏的内存页
+    ctx = multiprocessing.get_context("spawn")
+    
+    # 同时运行的案例各自从队列中取走一个核心组，结束后归还；
+    # CPU数少于进程数时核心组会变少，进程数随之减少
+    core_groups = partition_cpus(max_workers)
+    max_workers = len(core_groups)
+    core_queue = ctx.Queue()
+    for cores in core_groups:
+        core_queue.put(cores)
+    
+    # 相同电导率的案例作为一个任务在同一进程中依次运行
+    groups = group_cases(cases)
+    
+    # 总超时预算：每个案例最多1小时，按并行轮数与最大分组中较大者估计
+    rounds = max(math.ceil(len(cases) / max_workers), max(len(group) for group in groups))
+    deadline = time.time() + 3600 * rounds
+    
+    # 工作进程从父进程继承线程数环境变量 (取最大核心组的大小)，
+    # 使其导入NumPy时BLAS线程池就不超过分配的核心数
+    max_group = max(len(cores) for cores in core_groups)
+    with worker_thread_env(max_group):
+        # 工作进程被OOM killer或求解器段错误杀死时，ProcessPoolExecutor 会把
+        # 未完成的 future 标记为 BrokenProcessPool，而不是让结果永远等不到；
+        # max_tasks_per_child=1: 每组案例结束后回收工作进程，把PETSc/DMPlex缓存还给操作系统
+        executor = ProcessPoolExecutor(max_workers=max_workers,
+                                       mp_context=ctx,
+                                       initializer=init_worker,
+                                       initargs=(core_queue,),
+                                       max_tasks_per_child=1)
+    
+        # 按完成顺序收集结果
         results = []
-        for future in future_to_case:
-            try:
-                result = future.result(timeout=3600)  # 1小时超时
-                results.append(result)
-            except Exception as e:
-                case_name = future_to_case[future]
-                print(f"❌ 案例 {case_name} 超时或异常: {e}")
-                results.append((case_name, False, str(e)))
+        finished = set()
+        try:
+            futures = {executor.submit(run_case_group, group): group for group in groups}
+            for future in as_completed(futures, timeout=max(0.0, deadline - time.time())):
+                group = futures[future]
+                try:
+                    group_results = future.result()
+                except Exception as e:
+                    # 工作进程崩溃等异常: 整组案例记为失败
+                    group_results = []
+                    for case_name, _ in group:
+                        print(f"❌ 案例 {case_name} 出错: {e!r}")
+                        group_results.append((case_name, False, repr(e)))
+                results.extend(group_results)
+                finished.update(result[0] for result in group_results)
+        except Exception as e:
+            # 超时或其他异常: 把所有未完成的案例记为失败
+            reason = "超时" if isinstance(e, TimeoutError) else repr(e)
+            for case_name in cases:
+                if case_name not in finished:
+                    print(f"❌ 案例 {case_name} 失败: {reason}")
+                    results.append((case_name, False, reason))
+        finally:
+            # 取消尚未开始的任务，并终止仍卡在求解中的工作进程；
+            # 本脚本只通过进程池创建子进程，active_children 即为池中的工作进程
+            executor.shutdown(wait=False, cancel_futures=True)
+            processes = multiprocessing.active_children()
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.join()
     
     print_batch_summary(results)
 
@@ -144,7 +335,10 @@ def run_serial(cases):
     results = []
     total_start = time.time()
     
-    for i, (case_name, params) in enumerate(cases.items(), 1):
+    # 相同电导率的案例相邻运行
+    ordered_cases = [case for group in group_cases(cases) for case in group]
+    
+    for i, (case_name, params) in enumerate(ordered_cases, 1):
         print(f"\n📍 进度: {i}/{len(cases)} - 案例: {case_name}")
         
         case_start = time.time()
@@ -182,6 +376,54 @@ def print_batch_summary(results):
         for case_name, _, error in failed:
             print(f"   - {case_name}: {error}")
 
+# 压缩NPZ转存为未压缩副本的缓存目录名 (位于批量结果目录下)
+CACHE_DIRNAME = ".cache"
+
+def stat_result_file(npz_file, cache_file):
+    """统计单个结果文件
+
+    压缩的NPZ先转存为未压缩的 cache_file，使数组可以直接内存映射。
+    返回 (文件名, 点数, (最小值, 最大值, 平均值), 错误信息)。
+    """
+    try:
+        source = uncompressed_npz(npz_file, cache_file)
+        data = load_npz_arrays(source, ['coordinates', 'E_mag'])
+        E_mag = data['E_mag']
+        # 只做顺序归约，提示内核积极预读；统计完成后解除映射并释放页缓存
+        advise_sequential(E_mag)
+        n_points = len(data['coordinates'])
+        stats = (E_mag.min(), E_mag.max(), E_mag.mean())
+        del data, E_mag
+        drop_page_cache(source)
+        return npz_file.name, n_points, stats, None
+    except Exception as e:
+        return npz_file.name, 0, None, str(e)
+
+def iter_result_files(batch_dir):
+    """逐个产出批量结果目录下的NPZ文件 (跳过未压缩缓存目录)"""
+    for root, dirs, files in os.walk(batch_dir):
+        dirs[:] = [d for d in dirs if d != CACHE_DIRNAME]
+        for name in files:
+            if name.endswith(".npz"):
+                yield Path(root) / name
+
+def iter_file_stats(npz_files, batch_dir, max_workers=8):
+    """用线程池流式统计结果文件，按输入顺序产出 stat_result_file 的结果
+
+    多个文件的读取与归约相互独立，线程池让I/O与计算重叠；
+    同时在途的任务数有上限，内存占用与文件总数无关。
+    """
+    cache_dir = batch_dir / CACHE_DIRNAME
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window = deque()
+        for npz_file in npz_files:
+            cache_file = cache_dir / npz_file.relative_to(batch_dir)
+            window.append(executor.submit(stat_result_file, npz_file, cache_file))
+            if len(window) >= 2 * max_workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
 def analyze_batch_results():
     """分析批量结果"""
     
@@ -193,56 +435,80 @@ def analyze_batch_results():
         print("❌ 批量结果目录不存在")
         return
     
-    # 查找所有NPZ文件
-    npz_files = list(batch_dir.glob("**/*.npz"))
-    
-    if not npz_files:
-        print("❌ 未找到NPZ结果文件")
-        return
-    
-    print(f"📁 找到 {len(npz_files)} 个结果文件")
+    # 边遍历目录边统计，不预先生成完整的文件列表
+    file_stats = iter_file_stats(iter_result_files(batch_dir), batch_dir)
     
     # 统计分析
+    n_files = 0
     total_points = 0
     field_ranges = []
     
-    for npz_file in npz_files:
-        try:
-            data = np.load(npz_file, allow_pickle=True)
-            coordinates = data['coordinates']
-            E_mag = data['E_mag']
-            
-            total_points += len(coordinates)
-            field_ranges.append((E_mag.min(), E_mag.max(), E_mag.mean()))
-            
-            print(f"   📄 {npz_file.name}: {len(coordinates):,} 点")
-            
-        except Exception as e:
-            print(f"   ❌ {npz_file.name}: 读取失败 - {e}")
+    # 每个文件一行的报告先写入缓冲区，最后一次性输出
+    file_buf = io.StringIO()
+    
+    for name, n_points, field_range, error in file_stats:
+        n_files += 1
+        if error is not None:
+            print(f"   ❌ {name}: 读取失败 - {error}", file=file_buf)
+            continue
+        
+        total_points += n_points
+        field_ranges.append(field_range)
+        print(f"   📄 {name}: {n_points:,} 点", file=file_buf)
+    
+    if n_files == 0:
+        print("❌ 未找到NPZ结果文件")
+        return
     
-    print(f"\n📊 汇总统计:")
-    print(f"   🗂️  总数据点: {total_points:,}")
-    print(f"   📈 电场强度范围:")
+    buf = io.StringIO()
+    print(f"📁 找到 {n_files} 个结果文件", file=buf)
+    buf.write(file_buf.getvalue())
+    
+    print(f"\n📊 汇总统计:", file=buf)
+    print(f"   🗂️  总数据点: {total_points:,}", file=buf)
+    print(f"   📈 电场强度范围:", file=buf)
     
     if field_ranges:
         all_mins = [r[0] for r in field_ranges]
         all_maxs = [r[1] for r in field_ranges]
         all_means = [r[2] for r in field_ranges]
         
-        print(f"      最小值: {min(all_mins):.2e} V/m")
-        print(f"      最大值: {max(all_maxs):.2e} V/m")
-        print(f"      平均值: {np.mean(all_means):.2e} V/m")
+        print(f"      最小值: {min(all_mins):.2e} V/m", file=buf)
+        print(f"      最大值: {max(all_maxs):.2e} V/m", file=buf)
+        print(f"      平均值: {np.mean(all_means):.2e} V/m", file=buf)
+    
+    print(f"\n💡 数据用途建议:", file=buf)
+    print(f"   🤖 AI训练: 可用于电磁场预测模型", file=buf)
+    print(f"   📊 统计分析: 不同工况下的场分布特征", file=buf)
+    print(f"   🔍 异常检测: 基于场分布模式的故障识别", file=buf)
     
-    print(f"\n💡 数据用途建议:")
-    print(f"   🤖 AI训练: 可用于电磁场预测模型")
-    print(f"   📊 统计分析: 不同工况下的场分布特征")
-    print(f"   🔍 异常检测: 基于场分布模式的故障识别")
+    sys.stdout.write(buf.getvalue())
+
+def positive_int(value):
+    """argparse 类型: 不小于1的整数"""
+    try:
+        n = int(value)
+    except ValueError:
+        n = 0
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"必须为不小于1的整数: {value}")
+    return n
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="电力塔电磁场批量分析")
+    parser.add_argument("-y", "--yes", action="store_true", help="跳过确认提示，直接运行")
+    parser.add_argument("--workers", type=positive_int, default=min(multiprocessing.cpu_count(), 3),
+                        help="并行进程数")
+    parser.add_argument("--cases", nargs="*", help="只运行指定的案例 (默认全部)")
+    args = parser.parse_args()
+    
     print("⚠️  批量分析需要较长时间和大量计算资源")
     
-    response = input("是否继续? (y/N): ")
-    if response.lower() in ['y', 'yes']:
-        main()
-    else:
-        print("已取消批量分析")
+    # 只在交互终端中询问确认，nohup/cron/SLURM等非交互环境直接运行
+    if not args.yes and sys.stdin.isatty():
+        response = input("是否继续? (y/N): ")
+        if response.lower() not in ['y', 'yes']:
+            print("已取消批量分析")
+            sys.exit(0)
+    
+    main(selected_cases=args.cases, max_workers=args.workers)
@@ -0,0 +1 @@
+"""结果文件读取、测试数据生成与数据分析工具"""
@@ -0,0 +1,520 @@
+#!/usr/bin/env python3
+"""
+电磁场数据分析工具
+
+用于分析tower_em_solver生成的NPZ数据文件。
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+from pathlib import Path
+import argparse
+import os
+import sys
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import numba
+except ImportError:
+    numba = None  # 未安装numba时使用NumPy分别计算平均值和标准差
+
+try:
+    from fast_histogram import histogram1d as _fast_histogram1d
+    from fast_histogram import histogram2d as _fast_histogram2d
+except ImportError:
+    # 未安装fast-histogram时使用np.histogram/np.histogram2d
+    _fast_histogram1d = None
+    _fast_histogram2d = None
+
+from tower_em_utils.npz_reader import load_npz_arrays, load_npz_metadata
+
+def load_em_data(npz_file):
+    """加载电磁场数据
+    
+    返回 {名称: 数组} 字典。未压缩的成员直接按偏移量内存映射，
+    跳过 zipfile 的解码与CRC校验；元数据通过 load_npz_metadata 单独读取。
+    """
+    
+    try:
+        with zipfile.ZipFile(npz_file) as zf:
+            names = [Path(name).stem for name in zf.namelist()
+                     if name.endswith('.npy') and name != 'metadata.npy']
+        data = load_npz_arrays(npz_file, names)
+        print(f"✅ 成功加载: {npz_file}")
+        return data
+    except Exception as e:
+        print(f"❌ 加载失败: {e}")
+        return None
+
+def load_em_field(npz_file, key='E_mag'):
+    """只读取NPZ中的单个场量数组，不存在或读取失败时返回 None"""
+    
+    try:
+        field = load_npz_arrays(npz_file, [key])[key]
+        print(f"✅ 成功加载: {npz_file} ({key})")
+        return field
+    except Exception as e:
+        print(f"❌ 加载失败: {e}")
+        return None
+
+# 电场强度数量级分布的统计范围 [1e-10, 1e12)
+EXP_MIN, EXP_MAX = -10, 12
+
+def sorted_percentile(sorted_E, q):
+    """在已排序数组上按线性插值取百分位数 (与 np.percentile 默认方法一致)"""
+    
+    pos = np.asarray(q, dtype=float) / 100 * (len(sorted_E) - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, len(sorted_E) - 1)
+    return sorted_E[lo] + (sorted_E[hi] - sorted_E[lo]) * (pos - lo)
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _shifted_sums_kernel(E, shift, n_chunks):
+        """单次遍历求 (Σ(v-shift), Σ(v-shift)²)"""
+        chunk = (E.size + n_chunks - 1) // n_chunks
+        # 每个线程写各自的局部和，最后再合并
+        s1 = np.zeros(n_chunks)
+        s2 = np.zeros(n_chunks)
+        for c in numba.prange(n_chunks):
+            for i in range(c * chunk, min((c + 1) * chunk, E.size)):
+                d = E[i] - shift
+                s1[c] += d
+                s2[c] += d * d
+        return s1.sum(), s2.sum()
+
+def mean_std(E_mag, shift=0.0):
+    """计算平均值和标准差
+    
+    有numba时单次遍历同时累加一阶、二阶矩；shift 取接近平均值的数(如中位数)
+    可避免平方和相减时的精度损失。
+    """
+    
+    if numba is None:
+        return E_mag.mean(), E_mag.std()
+    
+    n = E_mag.size
+    s1, s2 = _shifted_sums_kernel(np.asarray(E_mag), float(shift), numba.get_num_threads())
+    mean = s1 / n
+    return shift + mean, np.sqrt(max(s2 / n - mean * mean, 0.0))
+
+def positive_values(sorted_E):
+    """已排序数组中的正值部分，返回视图，不分配布尔掩码也不拷贝"""
+    
+    return sorted_E[np.searchsorted(sorted_E, 0, side='right'):]
+
+def analyze_field_distribution(E_mag, title="电场强度分布", sorted_E=None):
+    """分析电场强度分布
+    
+    sorted_E 为排序后的 E_mag，可由调用方传入与绘图共用；
+    最小值、最大值、中位数和百分位数都直接从排序结果中读取。
+    """
+    
+    if sorted_E is None:
+        sorted_E = np.sort(E_mag)
+    
+    print(f"\n📊 {title}")
+    print("=" * 40)
+    
+    # 基本统计 - 平均值和标准差以中位数为偏移一次遍历求出
+    median = sorted_percentile(sorted_E, 50)
+    mean, std = mean_std(E_mag, shift=median)
+    print(f"数据点数: {len(E_mag):,}")
+    print(f"最小值: {sorted_E[0]:.2e} V/m")
+    print(f"最大值: {sorted_E[-1]:.2e} V/m")
+    print(f"平均值: {mean:.2e} V/m")
+    print(f"中位数: {median:.2e} V/m")
+    print(f"标准差: {std:.2e} V/m")
+    
+    # 数量级分布 - 一次log10求出各点的数量级，再用bincount计数；超出统计范围的点不计入
+    print(f"\n📈 数量级分布:")
+    n_bins = EXP_MAX - EXP_MIN
+    exps = np.floor(np.log10(positive_values(sorted_E))).astype(np.int64) - EXP_MIN
+    counts = np.bincount(exps[(exps >= 0) & (exps < n_bins)], minlength=n_bins)
+    for exp, count in zip(range(EXP_MIN, EXP_MAX), counts):
+        if count > 0:
+            percentage = count / len(E_mag) * 100
+            print(f"  1e{exp:2d} - 1e{exp+1:2d}: {count:8d} 点 ({percentage:5.2f}%)")
+    
+    # 百分位数 - 直接在排序结果上取值
+    percentiles = [1, 5, 10, 25, 50, 75, 90, 95, 99]
+    print(f"\n📊 百分位数分布:")
+    for p, value in zip(percentiles, sorted_percentile(sorted_E, percentiles)):
+        print(f"  {p:2d}%: {value:.2e} V/m")
+
+def analyze_spatial_distribution(coordinates, E_mag):
+    """分析空间分布特征"""
+    
+    print(f"\n🗺️  空间分布分析")
+    print("=" * 30)
+    
+    # 空间范围
+    x_range = [coordinates[:, 0].min(), coordinates[:, 0].max()]
+    y_range = [coordinates[:, 1].min(), coordinates[:, 1].max()]
+    z_range = [coordinates[:, 2].min(), coordinates[:, 2].max()]
+    
+    print(f"空间范围:")
+    print(f"  X: [{x_range[0]:.1f}, {x_range[1]:.1f}] m (跨度: {x_range[1]-x_range[0]:.1f} m)")
+    print(f"  Y: [{y_range[0]:.1f}, {y_range[1]:.1f}] m (跨度: {y_range[1]-y_range[0]:.1f} m)")
+    print(f"  Z: [{z_range[0]:.1f}, {z_range[1]:.1f}] m (跨度: {z_range[1]-z_range[0]:.1f} m)")
+    
+    # 高场强区域分析 - 用argpartition一次选出场强最高的5%点，只取这些行的坐标
+    k = max(1, len(E_mag) // 20)
+    high_field_idx = np.argpartition(E_mag, -k)[-k:]
+    high_field_coords = coordinates[high_field_idx]
+    high_field_threshold = E_mag[high_field_idx].min()
+    
+    if len(high_field_coords) > 0:
+        print(f"\n⚡ 高场强区域分析 (≥{high_field_threshold:.2e} V/m):")
+        print(f"  点数: {len(high_field_coords)} ({len(high_field_coords)/len(coordinates)*100:.1f}%)")
+        print(f"  X范围: [{high_field_coords[:, 0].min():.1f}, {high_field_coords[:, 0].max():.1f}] m")
+        print(f"  Y范围: [{high_field_coords[:, 1].min():.1f}, {high_field_coords[:, 1].max():.1f}] m")
+        print(f"  Z范围: [{high_field_coords[:, 2].min():.1f}, {high_field_coords[:, 2].max():.1f}] m")
+
+# 二维分布图的像素分辨率
+HIST2D_BINS = 256
+
+# 累积分布曲线每个案例有N个顶点，保存图表时让Agg按段分批渲染长路径；
+# 只在本模块保存图表时通过 rc_context 生效，不修改全局配置
+PLOT_RC = {'agg.path.chunksize': 10000}
+
+# 一维直方图的分箱数
+HIST_BINS = 50
+
+def log_bin_edges(lo, hi, bins=HIST_BINS):
+    """在 [lo, hi] 上生成均匀分箱边界；上界略微外扩，使最大值落在最后一个箱内"""
+    
+    hi = np.nextafter(max(hi, lo + 1e-6), np.inf)
+    return np.linspace(lo, hi, bins + 1)
+
+def histogram1d(values, edges):
+    """按给定的均匀分箱边界计数"""
+    
+    if _fast_histogram1d is not None:
+        return _fast_histogram1d(values, bins=len(edges) - 1, range=(edges[0], edges[-1]))
+    counts, _ = np.histogram(values, bins=edges)
+    return counts
+
+def plot_histogram(ax, values, edges, density=False, **kwargs):
+    """对预先确定的分箱计数后在 ax 上用柱状图绘制"""
+    
+    counts = histogram1d(values, edges)
+    widths = np.diff(edges)
+    if density:
+        counts = counts / (counts.sum() * widths)
+    return ax.bar(edges[:-1], counts, width=widths, align='edge', **kwargs)
+
+def histogram2d(x, y, bins, value_range, weights=None):
+    """均匀分箱的二维直方图，返回形状为 (len(y方向), len(x方向)) 的数组，可直接传给 imshow"""
+    
+    if _fast_histogram2d is not None:
+        H = _fast_histogram2d(x, y, bins=bins, range=value_range, weights=weights)
+    else:
+        H, _, _ = np.histogram2d(x, y, bins=bins, range=value_range, weights=weights)
+    return H.T
+
+def plot_binned_image(ax, x, y, ax_range, weights=None, bins=HIST2D_BINS, **kwargs):
+    """把散点分箱为一张栅格图绘制在 ax 上：给定 weights 时显示每个像素的平均值，否则显示点数
+    
+    绘制的对象数与点数无关，避免百万级散点逐个渲染；空像素保持透明。
+    """
+    
+    counts = histogram2d(x, y, bins, ax_range)
+    if weights is not None:
+        totals = histogram2d(x, y, bins, ax_range, weights=weights)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            image = totals / counts
+    else:
+        image = counts
+    image[counts == 0] = np.nan
+    
+    (xmin, xmax), (ymin, ymax) = ax_range
+    return ax.imshow(image, origin='lower', extent=[xmin, xmax, ymin, ymax],
+                     interpolation='nearest', **kwargs)
+
+def plot_field_analysis(coordinates, E_mag, output_dir="./analysis_plots", sorted_E=None):
+    """生成分析图表 (sorted_E 为已排序的 E_mag，用于累积分布和判断是否含零值)"""
+    
+    import matplotlib.pyplot as plt
+    from mpl_toolkits.mplot3d import Axes3D
+    
+    print(f"\n📈 生成分析图表...")
+    
+    # 创建输出目录
+    Path(output_dir).mkdir(exist_ok=True)
+    
+    if sorted_E is None:
+        sorted_E = np.sort(E_mag)
+    
+    # 对数场强只计算一次，供空间分布子图与3D图共用；非正值截断到1e-12以便着色
+    log_E_all = np.log10(np.maximum(E_mag, 1e-12))
+    
+    # 一次创建2x2子图，constrained_layout 在绘制时排版，无需 tight_layout
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8), constrained_layout=True)
+    
+    # 1. 电场强度直方图
+    ax = axes[0, 0]
+    # 直方图只统计正值，且不经过截断：sorted_E 已排序，正值部分是一个视图，
+    # 对数范围直接取首尾，小于1e-12的正值也落在各自的分箱中
+    pos_E = positive_values(sorted_E)
+    if len(pos_E) > 0:
+        log_E_pos = np.log10(pos_E)
+        edges = log_bin_edges(log_E_pos[0], log_E_pos[-1])
+        plot_histogram(ax, log_E_pos, edges, alpha=0.7, edgecolor='black')
+    ax.set_xlabel('log₁₀(电场强度) [V/m]')
+    ax.set_ylabel('频次')
+    ax.set_title('电场强度分布 (对数坐标)')
+    ax.grid(True, alpha=0.3)
+    
+    # 2. 空间分布（XY平面）- 每个像素显示落在其中各点的平均对数场强
+    ax = axes[0, 1]
+    x_coords, y_coords = coordinates[:, 0], coordinates[:, 1]
+    xy_range = [[x_coords.min(), x_coords.max()], [y_coords.min(), y_coords.max()]]
+    # 与原散点图的 axis('equal') 一致，X、Y 方向使用相同比例尺
+    image = plot_binned_image(ax, x_coords, y_coords, xy_range, weights=log_E_all,
+                              aspect='equal', cmap='viridis')
+    fig.colorbar(image, ax=ax, label='log₁₀(电场强度) [V/m]')
+    ax.set_xlabel('X [m]')
+    ax.set_ylabel('Y [m]')
+    ax.set_title('XY平面电场分布')
+    
+    # 3. 高度分布 - 显示 (高度, 对数场强) 平面内的点密度
+    ax = axes[1, 0]
+    z_coords = coordinates[:, 2]
+    ze_range = [[z_coords.min(), z_coords.max()], [log_E_all.min(), log_E_all.max()]]
+    image = plot_binned_image(ax, z_coords, log_E_all, ze_range, aspect='auto', cmap='Blues')
+    fig.colorbar(image, ax=ax, label='点数')
+    ax.set_xlabel('Z (高度) [m]')
+    ax.set_ylabel('log₁₀(电场强度) [V/m]')
+    ax.set_title('电场强度vs高度')
+    ax.grid(True, alpha=0.3)
+    
+    # 4. 累积分布函数
+    ax = axes[1, 1]
+    cum_prob = np.arange(1, len(sorted_E) + 1) / len(sorted_E)
+    ax.semilogx(sorted_E, cum_prob)
+    ax.set_xlabel('电场强度 [V/m]')
+    ax.set_ylabel('累积概率')
+    ax.set_title('电场强度累积分布')
+    ax.grid(True, alpha=0.3)
+    
+    plot_file = Path(output_dir) / "field_analysis.png"
+    with plt.rc_context(PLOT_RC):
+        fig.savefig(plot_file, dpi=300, bbox_inches='tight')
+    print(f"📊 图表已保存: {plot_file}")
+    
+    # 3D散点图（采样显示）
+    if len(coordinates) > 10000:
+        # 采样显示，避免图形过于复杂
+        sample_size = 10000
+        # 有放回地随机抽取下标，只分配 sample_size 个下标；预览图中少量重复点无影响。
+        # 不用等间隔跨步采样，避免与结构化网格的点序周期重合而只取到个别层
+        rng = np.random.default_rng(0)
+        indices = rng.integers(0, len(coordinates), size=sample_size)
+        coords_sample = coordinates[indices]
+        log_E_sample = log_E_all[indices]
+    else:
+        coords_sample = coordinates
+        log_E_sample = log_E_all
+    
+    fig = plt.figure(figsize=(12, 9))
+    ax = fig.add_subplot(111, projection='3d')
+    
+    scatter = ax.scatter(coords_sample[:, 0], coords_sample[:, 1], coords_sample[:, 2],
+                        c=log_E_sample, s=0.5, alpha=0.6, cmap='plasma',
+                        rasterized=True)
+    
+    ax.set_xlabel('X [m]')
+    ax.set_ylabel('Y [m]')
+    ax.set_zlabel('Z [m]')
+    ax.set_title(f'3D电场分布 (采样 {len(coords_sample):,} 点)')
+    
+    cbar = plt.colorbar(scatter, ax=ax, shrink=0.5, aspect=20)
+    cbar.set_label('log₁₀(电场强度) [V/m]')
+    
+    plot_3d_file = Path(output_dir) / "field_3d_distribution.png"
+    plt.savefig(plot_3d_file, dpi=300, bbox_inches='tight')
+    print(f"📊 3D图表已保存: {plot_3d_file}")
+    
+    plt.show()
+
+def prepare_case(case_name, E_mag):
+    """一次性计算单个案例在对比表格和各对比图中用到的量"""
+    
+    E_mag = np.asarray(E_mag)
+    sorted_E = np.sort(E_mag)
+    return {
+        'name': case_name,
+        'n_points': len(E_mag),
+        'sorted': sorted_E,
+        'log_pos': np.log10(positive_values(sorted_E)),
+        # 最小值、平均值、中位数、95%分位、最大值
+        'stats': (sorted_E[0], E_mag.mean(), sorted_percentile(sorted_E, 50),
+                  sorted_percentile(sorted_E, 95), sorted_E[-1]),
+    }
+
+def load_case(npz_file):
+    """读取单个案例的电场强度并完成预计算，读取失败时返回 None
+    
+    对比只需要电场强度，不读取坐标等其他成员。
+    """
+    
+    E_mag = load_em_field(npz_file)
+    if E_mag is None:
+        return None
+    return prepare_case(Path(npz_file).stem, E_mag)
+
+def compare_cases(npz_files):
+    """比较多个案例"""
+    
+    print(f"\n📊 多案例对比分析")
+    print("=" * 30)
+    
+    # 每个案例只读取并统计一次，表格和各子图都复用这些结果。
+    # 各案例相互独立，读取和排序时NumPy会释放GIL，用线程池并行预计算，
+    # map 保持输入顺序
+    n_workers = min(8, len(npz_files), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        cases = [case for case in executor.map(load_case, npz_files) if case is not None]
+    
+    if len(cases) < 2:
+        print("❌ 需要至少2个有效案例进行对比")
+        return
+    
+    print(f"📋 对比 {len(cases)} 个案例:")
+    
+    # 创建对比表格
+    print(f"\n{'案例名称':<20} {'数据点数':<10} {'最小值':<12} {'最大值':<12} {'平均值':<12}")
+    print("-" * 70)
+    
+    for case in cases:
+        E_min, E_mean, _, _, E_max = case['stats']
+        print(f"{case['name']:<20} {case['n_points']:<10,} {E_min:<12.2e} {E_max:<12.2e} {E_mean:<12.2e}")
+    
+    # 生成对比图表
+    fig, axes = plt.subplots(2, 2, figsize=(15, 10), constrained_layout=True)
+    
+    # 1. 电场强度分布对比
+    ax = axes[0, 0]
+    # 所有案例共用一套分箱边界；log_pos 按升序排列，范围直接取首尾元素
+    log_cases = [case for case in cases if len(case['log_pos']) > 0]
+    if log_cases:
+        edges = log_bin_edges(min(case['log_pos'][0] for case in log_cases),
+                              max(case['log_pos'][-1] for case in log_cases))
+    for case in log_cases:
+        plot_histogram(ax, case['log_pos'], edges, density=True, alpha=0.5, label=case['name'])
+    ax.set_xlabel('log₁₀(电场强度) [V/m]')
+    ax.set_ylabel('概率密度')
+    ax.set_title('电场强度分布对比')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    
+    # 2. 累积分布对比
+    ax = axes[0, 1]
+    for case in cases:
+        sorted_E = case['sorted']
+        cum_prob = np.arange(1, len(sorted_E) + 1) / len(sorted_E)
+        ax.semilogx(sorted_E, cum_prob, label=case['name'], linewidth=2)
+    ax.set_xlabel('电场强度 [V/m]')
+    ax.set_ylabel('累积概率')
+    ax.set_title('累积分布对比')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    
+    # 3. 统计量对比
+    ax = axes[1, 0]
+    stats = ['最小值', '平均值', '中位数', '95%分位', '最大值']
+    x_pos = np.arange(len(stats))
+    
+    for i, case in enumerate(cases):
+        ax.semilogy(x_pos + i*0.1, case['stats'], 'o-', label=case['name'], markersize=8)
+    
+    ax.set_xticks(x_pos)
+    ax.set_xticklabels(stats)
+    ax.set_ylabel('电场强度 [V/m]')
+    ax.set_title('统计量对比')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    
+    # 4. 数据点数对比
+    ax = axes[1, 1]
+    point_counts = [case['n_points'] for case in cases]
+    bars = ax.bar([case['name'] for case in cases], point_counts)
+    ax.set_ylabel('数据点数')
+    ax.set_title('数据点数对比')
+    ax.tick_params(axis='x', labelrotation=45)
+    
+    # 在柱子上显示数值
+    for bar, count in zip(bars, point_counts):
+        ax.text(bar.get_x() + bar.get_width()/2, bar.get_height(),
+                f'{count:,}', ha='center', va='bottom')
+    
+    compare_file = "./comparison_analysis.png"
+    with plt.rc_context(PLOT_RC):
+        fig.savefig(compare_file, dpi=300, bbox_inches='tight')
+    print(f"📊 对比图表已保存: {compare_file}")
+    
+    plt.show()
+
+def main():
+    """主函数"""
+    
+    parser = argparse.ArgumentParser(description="电磁场数据分析工具")
+    parser.add_argument("files", nargs="+", help="NPZ数据文件路径")
+    parser.add_argument("--plot", action="store_true", help="生成分析图表")
+    parser.add_argument("--compare", action="store_true", help="多案例对比")
+    parser.add_argument("--output", default="./analysis_plots", help="图表输出目录")
+    
+    args = parser.parse_args()
+    
+    print("📊 电磁场数据分析工具")
+    print("=" * 40)
+    
+    # 验证文件存在
+    valid_files = []
+    for file_path in args.files:
+        if Path(file_path).exists():
+            valid_files.append(file_path)
+        else:
+            print(f"❌ 文件不存在: {file_path}")
+    
+    if not valid_files:
+        print("❌ 没有有效的输入文件")
+        return
+    
+    if len(valid_files) == 1 and not args.compare:
+        # 单文件分析
+        data = load_em_data(valid_files[0])
+        if data is None:
+            return
+        
+        # 提取数据
+        coordinates = data['coordinates']
+        E_mag = data['E_mag']
+        
+        # 分析 - 排序结果在统计与累积分布图之间共用
+        sorted_E = np.sort(E_mag)
+        analyze_field_distribution(E_mag, sorted_E=sorted_E)
+        analyze_spatial_distribution(coordinates, E_mag)
+        
+        # 打印元数据
+        metadata = load_npz_metadata(valid_files[0])
+        if metadata is not None:
+            print(f"\n📋 元数据信息:")
+            for key, value in metadata.items():
+                if key != 'box_filter_info':
+                    print(f"  {key}: {value}")
+        
+        # 生成图表
+        if args.plot:
+            plot_field_analysis(coordinates, E_mag, args.output, sorted_E=sorted_E)
+    
+    elif len(valid_files) > 1 or args.compare:
+        # 多文件对比
+        compare_cases(valid_files)
+    
+    print(f"\n✅ 分析完成")
+
+if __name__ == "__main__":
+    main()
@@ -7,23 +7,16 @@
 
 import numpy as np
 import argparse
+import json
 from pathlib import Path
 
-def generate_simple_tower_geo(output_file="simple_tower.geo", 
-                             tower_height=50.0, 
-                             tower_width=10.0,
-                             wire_height=45.0,
-                             domain_size=100.0):
-    """生成简化输电塔的Gmsh几何文件"""
-    
-    print(f"📐 生成简化输电塔几何文件")
-    print(f"   塔高: {tower_height} m")
-    print(f"   塔宽: {tower_width} m") 
-    print(f"   导线高度: {wire_height} m")
-    print(f"   计算域: {domain_size} m")
-    
-    # Gmsh几何代码
-    geo_content = f"""
+try:
+    import numexpr
+except ImportError:
+    numexpr = None  # 未安装numexpr时使用NumPy广播计算
+
+# 简化输电塔的Gmsh几何模板，花括号占位符由 str.format 填入
+_GEO_TEMPLATE = """
 // 简化输电塔几何 - 自动生成
 // 参数设置
 tower_height = {tower_height};
@@ -139,9 +132,26 @@ Mesh.ElementOrder = 2;
 Mesh.Algorithm = 6;  // Frontal-Delaunay for 2D
 Mesh.Algorithm3D = 1; // Delaunay for 3D
 """
+
+def generate_simple_tower_geo(output_file="simple_tower.geo", 
+                             tower_height=50.0, 
+                             tower_width=10.0,
+                             wire_height=45.0,
+                             domain_size=100.0):
+    """生成简化输电塔的Gmsh几何文件"""
+    
+    print(f"📐 生成简化输电塔几何文件")
+    print(f"   塔高: {tower_height} m")
+    print(f"   塔宽: {tower_width} m") 
+    print(f"   导线高度: {wire_height} m")
+    print(f"   计算域: {domain_size} m")
     
-    # 写入文件
-    with open(output_file, 'w', encoding='utf-8') as f:
+    # 写入文件 - 模板在模块加载时构建一次，这里只做参数替换
+    geo_content = _GEO_TEMPLATE.format(tower_height=tower_height,
+                                       tower_width=tower_width,
+                                       wire_height=wire_height,
+                                       domain_size=domain_size)
+    with open(output_file, 'w', encoding='utf-8', buffering=1 << 16) as f:
         f.write(geo_content)
     
     print(f"✅ 几何文件已生成: {output_file}")
@@ -158,20 +168,36 @@ def generate_test_data():
     y = np.linspace(-50, 50, 50) 
     z = np.linspace(0, 80, 40)
     
-    X, Y, Z = np.meshgrid(x, y, z)
-    coordinates = np.column_stack([X.ravel(), Y.ravel(), Z.ravel()])
-    
-    # 模拟电场分布
-    # 在导体附近场强较高
-    r_tower = np.sqrt(X**2 + Y**2)
-    r_wire_a = np.sqrt((X + 10)**2 + Y**2 + (Z - 45)**2)
-    r_wire_b = np.sqrt(X**2 + Y**2 + (Z - 45)**2)
-    r_wire_c = np.sqrt((X - 10)**2 + Y**2 + (Z - 45)**2)
+    # 稀疏网格: 默认 'xy' 索引下 X/Y/Z 分别只是 (1,nx,1)/(ny,1,1)/(1,1,nz) 的一维向量，
+    # 场量公式通过广播直接得到完整的三维结果，不展开三份完整坐标数组；
+    # 广播结果与完整 meshgrid 同为 (ny,nx,nz)，点的顺序保持不变
+    X, Y, Z = np.meshgrid(x, y, z, sparse=True)
+    # 坐标直接写入预分配的 (ny,nx,nz,3) 数组，各分量由稀疏网格广播填入，
+    # reshape 为 (N,3) 只是视图，不再经过 ravel 拷贝和 column_stack
+    coordinates = np.empty((len(y), len(x), len(z), 3))
+    coordinates[..., 0] = X
+    coordinates[..., 1] = Y
+    coordinates[..., 2] = Z
+    coordinates = coordinates.reshape(-1, 3)
     
-    # 基础场 + 导体增强
-    E_base = 1e3 * np.exp(-r_tower/20)
-    E_wire = 1e6 * (np.exp(-r_wire_a/2) + np.exp(-r_wire_b/2) + np.exp(-r_wire_c/2))
-    E_mag = (E_base + E_wire).ravel()
+    # 模拟电场分布: 基础场 + 导体增强，在导体附近场强较高
+    if numexpr is not None:
+        # 平方根、指数与求和融合为一次遍历，不产生中间数组
+        E_mag = numexpr.evaluate(
+            "1e3 * exp(-sqrt(X**2 + Y**2) / 20)"
+            " + 1e6 * (exp(-sqrt((X + 10)**2 + Y**2 + (Z - 45)**2) / 2)"
+            " + exp(-sqrt(X**2 + Y**2 + (Z - 45)**2) / 2)"
+            " + exp(-sqrt((X - 10)**2 + Y**2 + (Z - 45)**2) / 2))"
+        ).ravel()
+    else:
+        # 只依赖 X、Y 的部分保持二维，与 Z 相关的项再广播到三维
+        rho2 = X**2 + Y**2
+        dz2 = (Z - 45)**2
+        E_base = 1e3 * np.exp(-np.sqrt(rho2) / 20)
+        E_wire = (np.exp(-np.sqrt((X + 10)**2 + Y**2 + dz2) / 2)
+                  + np.exp(-np.sqrt(rho2 + dz2) / 2)
+                  + np.exp(-np.sqrt((X - 10)**2 + Y**2 + dz2) / 2))
+        E_mag = (E_base + 1e6 * E_wire).ravel()
     
     # 添加噪声
     E_mag += np.random.normal(0, E_mag.max()*0.01, E_mag.shape)
@@ -189,7 +215,7 @@ def generate_test_data():
     epsilon = np.full(len(coordinates), 8.854e-12)
     sigma = np.full(len(coordinates), 0.0)
     
-    # 保存测试数据
+    # 保存测试数据 - 与求解器结果一样写成未压缩NPZ，读取端可直接内存映射各成员
     output_file = "test_em_data.npz"
     np.savez(output_file,
              coordinates=coordinates,
@@ -200,12 +226,16 @@ def generate_test_data():
              E_mag=E_mag,
              epsilon=epsilon,
              sigma=sigma,
-             freq=50.0,
-             metadata={
-                 'test_data': True,
-                 'generator': 'mesh_generator.py',
-                 'description': 'Synthetic EM field data for testing'
-             })
+             freq=50.0)
+    
+    # 元数据与求解器输出一致，保存为JSON文件
+    metadata = {
+        'test_data': True,
+        'generator': 'mesh_generator.py',
+        'description': 'Synthetic EM field data for testing'
+    }
+    with open(Path(output_file).with_suffix('.meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
     
     print(f"✅ 测试数据已生成: {output_file}")
     print(f"   数据点数: {len(coordinates):,}")
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+NPZ结果文件读取工具
+
+tower_em_solver 用 np.savez 写出的NPZ是未压缩(ZIP_STORED)的ZIP归档，
+其中每个 .npy 成员在文件中是连续存放的，可以直接按偏移量内存映射，
+只在归约计算时按需读入实际访问的页面，而不必把整个数组读进内存。
+"""
+
+import json
+import mmap
+import os
+import shutil
+import zipfile
+from pathlib import Path
+import numpy as np
+
+# ZIP本地文件头的固定长度 (签名 + 版本 + ... + 文件名长度 + 扩展字段长度)
+_ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def _member_data_offset(fp, info):
+    """根据本地文件头计算成员数据在归档中的起始偏移"""
+    fp.seek(info.header_offset)
+    header = fp.read(_ZIP_LOCAL_HEADER_SIZE)
+    if header[:4] != b"PK\x03\x04":
+        raise ValueError(f"无效的ZIP本地文件头: {info.filename}")
+    name_len = int.from_bytes(header[26:28], "little")
+    extra_len = int.from_bytes(header[28:30], "little")
+    return info.header_offset + _ZIP_LOCAL_HEADER_SIZE + name_len + extra_len
+
+
+def _mmap_stored_member(npz_file, zf, info):
+    """内存映射未压缩的 .npy 成员，无法映射时返回 None"""
+    fp = zf.fp
+    fp.seek(_member_data_offset(fp, info))
+
+    version = np.lib.format.read_magic(fp)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fp)
+    elif version == (2, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fp)
+    else:
+        return None
+
+    # 对象数组(如pickle的元数据)和0维标量不适合映射
+    if dtype.hasobject or len(shape) == 0:
+        return None
+
+    return np.memmap(npz_file, dtype=dtype, mode="r", offset=fp.tell(),
+                     shape=shape, order="F" if fortran_order else "C")
+
+
+def _read_stored_member(zf, info):
+    """直接从归档文件中读取未压缩的 .npy 成员
+
+    跳过 ZipExtFile，省去逐块CRC-32校验和额外的缓冲拷贝；
+    数据由 read_array 从底层文件直接读入。
+    """
+    fp = zf.fp
+    fp.seek(_member_data_offset(fp, info))
+    return np.lib.format.read_array(fp, allow_pickle=False)
+
+
+def load_npz_arrays(npz_file, names, mmap=True):
+    """读取NPZ中的指定数组
+
+    未压缩成员默认以只读内存映射方式返回，mmap=False 或无法映射
+    (如0维标量)时直接从归档文件读取；只有压缩成员(savez_compressed)
+    经过 zipfile 解压读取。
+    """
+    arrays = {}
+    with zipfile.ZipFile(npz_file) as zf:
+        for name in names:
+            info = zf.getinfo(f"{name}.npy")
+            array = None
+            if info.compress_type == zipfile.ZIP_STORED:
+                if mmap:
+                    array = _mmap_stored_member(npz_file, zf, info)
+                if array is None:
+                    array = _read_stored_member(zf, info)
+            if array is None:
+                with zf.open(info) as f:
+                    array = np.lib.format.read_array(f, allow_pickle=False)
+            arrays[name] = array
+    return arrays
+
+
+def advise_sequential(array):
+    """提示内核将按顺序一次性读取内存映射数组，触发更积极的预读
+
+    非内存映射数组或平台不支持 madvise 时不做任何操作。
+    """
+    mm = getattr(array, "_mmap", None)
+    if mm is None or not hasattr(mm, "madvise"):
+        return
+    for advice in ("MADV_SEQUENTIAL", "MADV_WILLNEED"):
+        if hasattr(mmap, advice):
+            mm.madvise(getattr(mmap, advice))
+
+
+def drop_page_cache(npz_file):
+    """归约完成后释放该文件占用的页缓存，避免批量扫描挤掉其他缓存
+
+    只对已解除映射的页面生效，调用前应先释放对内存映射数组的引用。
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(npz_file, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def is_compressed_npz(npz_file):
+    """判断NPZ中是否有压缩成员 (由 np.savez_compressed 写出)"""
+    with zipfile.ZipFile(npz_file) as zf:
+        return any(info.compress_type != zipfile.ZIP_STORED for info in zf.infolist())
+
+
+def uncompressed_npz(npz_file, cache_file):
+    """返回可直接内存映射的NPZ路径
+
+    未压缩的NPZ原样返回；压缩的NPZ在首次访问时解压重写为未压缩的
+    cache_file，之后直接复用，源文件比缓存新时重新生成。
+    """
+    npz_file = Path(npz_file)
+    if not is_compressed_npz(npz_file):
+        return npz_file
+
+    cache_file = Path(cache_file)
+    if not cache_file.exists() or cache_file.stat().st_mtime < npz_file.stat().st_mtime:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再替换，避免中断时留下不完整的缓存
+        # 逐成员解压后原样写为不压缩成员，不解析 .npy 内容，也就无需 pickle
+        tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+        with zipfile.ZipFile(npz_file) as zin, \
+                zipfile.ZipFile(tmp_file, "w", zipfile.ZIP_STORED, allowZip64=True) as zout:
+            for info in zin.infolist():
+                with zin.open(info) as src, zout.open(info.filename, "w", force_zip64=True) as dst:
+                    shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(tmp_file, cache_file)
+    return cache_file
+
+
+def metadata_path(npz_file):
+    """NPZ结果文件对应的JSON元数据文件路径 (<name>.meta.json)"""
+    return Path(npz_file).with_suffix(".meta.json")
+
+
+def load_npz_metadata(npz_file):
+    """读取结果文件的元数据字典，不存在时返回 None
+
+    优先读取JSON元数据文件；旧版结果把元数据pickle在NPZ内部，
+    此时只对该成员启用 allow_pickle 读取，其余数组成员不经过pickle。
+    """
+    meta_file = metadata_path(npz_file)
+    if meta_file.exists():
+        with open(meta_file, encoding="utf-8") as f:
+            return json.load(f)
+
+    with zipfile.ZipFile(npz_file) as zf:
+        if "metadata.npy" not in zf.namelist():
+            return None
+        with zf.open("metadata.npy") as f:
+            return np.lib.format.read_array(f, allow_pickle=True).item()